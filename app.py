@@ -1,12 +1,11 @@
 # app.py
 import streamlit as st
 import pandas as pd
-import datetime
 import json
 import uuid
 from pathlib import Path
-import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -14,9 +13,10 @@ logger = logging.getLogger(__name__)
 
 # Import modules
 try:
-    from modules.data_handler import load_and_process_data
-    from modules.db_handler import init_supabase, insert_report, fetch_reports, update_report_status, delete_report_metadata
-    from modules.storage_handler import init_gcs, upload_photo, delete_photo
+    from modules.data_handler import load_record_count, load_binned_hotspots
+    from modules.clients import init_clients
+    from modules.db_handler import insert_report, fetch_reports, update_report_status, delete_report_metadata, set_reports_changed_hook
+    from modules.storage_handler import compress_photo, photo_location, upload_photo, delete_photo, sign_urls
     # from modules.utils import DB_TABLE_REPORTS
 except ImportError as e:
      st.error(f"Error importing modules: {e}. Make sure the 'modules' folder exists and contains __init__.py.")
@@ -35,19 +35,215 @@ st.set_page_config(
 )
 
 # --- Initialize Connections ---
+clients = init_clients()
+supabase_client, gcs_bucket = clients.supabase, clients.bucket
+
 @st.cache_resource
-def initialize_backend():
-    logger.info("Attempting to initialize backend services...")
-    supabase_client = init_supabase()
-    gcs_bucket = init_gcs()
-    return supabase_client, gcs_bucket
+def _io_executor() -> ThreadPoolExecutor:
+    """Shared pool for overlapping independent GCS and Supabase calls, and for background cleanup."""
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="trashguard-io")
+
+REPORT_SIZES = ["Small", "Medium", "Large"]
+REPORT_TYPES = ["Household Bags", "Furniture", "Mattress", "E-waste", "Tires", "Construction", "Hazardous", "Yard Waste", "Other"]
+REPORT_STATUSES = ["New", "Reviewed", "Cleaned"]
+# Stored extension -> (Pillow format, content type). Photos keep their uploaded format,
+# so the path is known before compression and matches the stored bytes either way.
+REPORT_PHOTO_FORMATS = {".jpg": ("JPEG", "image/jpeg"), ".png": ("PNG", "image/png")}
+
+# Only the columns the admin panel shows or acts on
+ADMIN_REPORT_COLUMNS = "report_id,created_at,status,report_size,report_type,latitude,longitude,image_url,gcs_path"
+
+def _build_admin_view(reports: list[dict]) -> tuple[dict, pd.DataFrame, tuple, tuple]:
+    """Builds the sidebar table, report lookup and selectbox labels/IDs with vectorized column ops."""
+    raw_df = pd.DataFrame(reports)
+    report_details = dict(zip(raw_df["report_id"], reports))
+    created = pd.to_datetime(raw_df["created_at_dt"], utc=True) # Already parsed by fetch_reports
+    lat = pd.to_numeric(raw_df["latitude"], errors="coerce")
+    lon = pd.to_numeric(raw_df["longitude"], errors="coerce")
+    # Built directly in display order with typed columns (categoricals, timestamps, floats),
+    # so Arrow serialization is compact and formatting is left to column_config
+    report_df = pd.DataFrame({
+        "Report ID": raw_df["report_id"].str[:8],
+        "Time": created,
+        "Status": pd.Categorical(raw_df["status"], categories=REPORT_STATUSES),
+        "Size": pd.Categorical(raw_df["report_size"], categories=REPORT_SIZES),
+        "Type": pd.Categorical(raw_df["report_type"], categories=REPORT_TYPES),
+        "Lat": lat.astype("float64"),
+        "Lng": lon.astype("float64"),
+    })
+    report_df.index = raw_df["report_id"]
+    # Selectbox is keyed by position into these parallel tuples
+    display_labels = ("<Select Report>",) + tuple(raw_df["report_id"].str[:8] + "... (" + created.dt.strftime('%H:%M').fillna("") + ")")
+    report_ids = (None,) + tuple(report_df.index)
+    return report_details, report_df, display_labels, report_ids
+
+# The one report cache: admin panel reruns reuse the fetched and built table instead of hitting
+# Supabase on every widget change. The leading underscore stops Streamlit from hashing the client.
+# A fetch error raises, so it is never cached; db_handler clears it after every successful write.
+@st.cache_data(ttl=30, max_entries=16, show_spinner=False)
+def _cached_admin_view(_client, limit: int, before_cursor: tuple[str, str] | None, status: str | None):
+    reports, fetch_error = fetch_reports(_client, limit=limit, before_cursor=before_cursor, status=status, columns=ADMIN_REPORT_COLUMNS)
+    if fetch_error: raise RuntimeError(fetch_error)
+    if not reports: return None, None
+    last = reports[-1]
+    next_cursor = (last.get("created_at"), last.get("report_id")) if len(reports) == limit else None
+    return _build_admin_view(reports), next_cursor
+
+set_reports_changed_hook(_cached_admin_view.clear)
+
+def _fetch_admin_view(client, limit: int, before_cursor: tuple[str, str] | None, status: str | None):
+    """
+    Fetches one page of reports and builds the admin table from it (cached).
+    Returns (admin view, (created_at, report_id) cursor for the next page or None on the last page, error).
+    """
+    try:
+        admin_view, next_cursor = _cached_admin_view(client, limit, before_cursor, status)
+        return admin_view, next_cursor, None
+    except RuntimeError as e:
+        return None, None, str(e)
+
+def _photo_extension(uploaded_photo) -> str:
+    """Stored extension for an uploaded photo: .png for PNGs, .jpg otherwise (.jpeg included)."""
+    return ".png" if Path(uploaded_photo.name).suffix.lower() == ".png" or uploaded_photo.type == "image/png" else ".jpg"
+
+def _compress_and_upload(bucket, report_id, uploaded_photo, extension):
+    """Shrinks the photo in its own format (falling back to the original) and uploads it; runs off the script thread."""
+    image_format, content_type = REPORT_PHOTO_FORMATS[extension]
+    photo_file = compress_photo(uploaded_photo, image_format=image_format)
+    if photo_file is not None:
+        return upload_photo(bucket, report_id, photo_file, extension, content_type)
+    return upload_photo(bucket, report_id, uploaded_photo, extension, uploaded_photo.type)
+
+def _cleanup_orphaned_photo(bucket, gcs_path):
+    """Deletes an uploaded image whose DB insert failed; runs off the script thread."""
+    deleted, del_err = delete_photo(bucket, gcs_path)
+    if del_err: logger.error(f"Failed to delete orphaned image {gcs_path}: {del_err}")
+    else: logger.info(f"Orphaned image {gcs_path} deleted.")
+
+def _rollback_report_metadata(client, report_id):
+    """Deletes a report row whose image upload failed; runs off the script thread."""
+    deleted, del_err = delete_report_metadata(client, report_id)
+    if del_err: logger.error(f"Failed to roll back report {report_id}: {del_err}")
+    else: logger.info(f"Rolled back report {report_id} after failed upload.")
+
+def _delete_report(bucket, client, report_id, gcs_path):
+    """Deletes a report's metadata and image concurrently. Returns ((deleted, error), (photo deleted, photo error))."""
+    executor = _io_executor()
+    meta_future = executor.submit(delete_report_metadata, client, report_id)
+    photo_future = executor.submit(delete_photo, bucket, gcs_path) if gcs_path else None
+    return meta_future.result(), photo_future.result() if photo_future else (False, None)
+
+def _script_json(json_str: str) -> str:
+    """Makes a JSON string safe to inline in a <script> block (no early '</script>')."""
+    return json_str.replace("</", "<\\/")
+
+# Static map shell with the hotspot payload baked in. The string is identical across reruns,
+# so Streamlit keeps the iframe mounted and the Maps SDK is only initialized once per data refresh.
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _map_template(maps_key: str, map_id: str, hotspots_json: str) -> str:
+    return f"""
+    <div id="map" style="height:500px; width:100%;"></div>
+    <script>
+        let map = null, marker = null, infowindow = null, pendingLocation;
+        async function initMap() {{
+            // With loading=async only the bootstrap is fetched up front; pull just the libraries we use
+            await Promise.all([google.maps.importLibrary("maps"), google.maps.importLibrary("marker")]);
+            const sanJose = {{ lat: 37.3382, lng: -121.8863 }};
+            map = new google.maps.Map(document.getElementById('map'), {{ zoom: 12, center: sanJose, mapTypeId: 'roadmap', mapId: {json.dumps(map_id)} }});
+            infowindow = new google.maps.InfoWindow();
+            const heatmapLevels = {_script_json(hotspots_json)};
+            // Each level is flat arrays of integer tile indices: degrees = index / scale
+            const toPoints = (level) => {{
+                const points = [];
+                if (!level) return points;
+                for (let i = 0; i < level.lat.length; i++) {{
+                    points.push({{ lat: level.lat[i] / level.scale, lng: level.lng[i] / level.scale, weight: level.w[i] }});
+                }}
+                return points;
+            }};
+            // R-tree per zoom level so only points inside the viewport reach the heatmap layer
+            const buildIndex = (points) => {{
+                const tree = new RBush();
+                tree.load(points.map(p => ({{ minX: p.lng, minY: p.lat, maxX: p.lng, maxY: p.lat, point: p }})));
+                return tree;
+            }};
+            const neighborhoodPoints = toPoints(heatmapLevels.neighborhood);
+            if (neighborhoodPoints.length > 0) {{
+                 const cityIndex = buildIndex(toPoints(heatmapLevels.city));
+                 const neighborhoodIndex = buildIndex(neighborhoodPoints);
+                 // deck.gl computes the heatmap in WebGL shaders instead of projecting points on the CPU
+                 const overlay = new deck.GoogleMapsOverlay({{ layers: [] }});
+                 overlay.setMap(map);
+                 map.addListener('idle', () => {{
+                     const bounds = map.getBounds();
+                     if (!bounds) return;
+                     const ne = bounds.getNorthEast(), sw = bounds.getSouthWest();
+                     const padLat = (ne.lat() - sw.lat()) * 0.1, padLng = (ne.lng() - sw.lng()) * 0.1; // keep edge blobs intact
+                     // Binned city-level cells when zoomed out, original tiles when zoomed in
+                     const cityLevel = map.getZoom() < 14;
+                     const visible = (cityLevel ? cityIndex : neighborhoodIndex).search({{
+                         minX: sw.lng() - padLng, minY: sw.lat() - padLat, maxX: ne.lng() + padLng, maxY: ne.lat() + padLat }});
+                     overlay.setProps({{ layers: [new deck.HeatmapLayer({{
+                         id: 'hotspots', data: visible.map(item => item.point),
+                         getPosition: d => [d.lng, d.lat], getWeight: d => d.weight, radiusPixels: 30, opacity: 0.75 }})] }});
+                 }});
+            }} else {{ displayNoDataMessage(map, sanJose); }}
+            showLocation(pendingLocation !== undefined ? pendingLocation : publishedLocation());
+        }}
+        // Location published by the messenger iframe before this map finished loading
+        function publishedLocation() {{
+            const frames = window.parent.frames;
+            for (let i = 0; i < frames.length; i++) {{
+                try {{ if (frames[i].trashguardLocation !== undefined) return frames[i].trashguardLocation; }} catch (e) {{ /* cross-origin frame */ }}
+            }}
+            return null;
+        }}
+        function showLocation(currentLocation) {{
+            if (!map) {{ pendingLocation = currentLocation; return; }}
+            if (marker) {{ marker.map = null; marker = null; }}
+            if (currentLocation && currentLocation.latitude) {{
+                const position = {{ lat: currentLocation.latitude, lng: currentLocation.longitude }};
+                marker = new google.maps.marker.AdvancedMarkerElement({{position: position, map: map, title: `Captured Location (Accuracy: ${{currentLocation.accuracy?.toFixed(0)}}m)`}});
+                map.setCenter(position); map.setZoom(16);
+                infowindow.setContent(`Captured Location<br>Acc: ${{currentLocation.accuracy?.toFixed(0)}}m`);
+                marker.addListener('click', () => {{ infowindow.open({{ anchor: marker, map }}); }});
+            }}
+        }}
+        window.addEventListener('message', (event) => {{
+            // Only accept the location from a sibling component frame served from this app's origin
+            if (event.origin !== window.origin || !event.source || event.source.parent !== window.parent) return;
+            if (event.data && event.data.type === 'trashguard-location') showLocation(event.data.location);
+        }});
+        function displayNoDataMessage(map, position) {{ /* ... (same) ... */ }}
+    </script>
+    <script src="https://unpkg.com/rbush@3.0.1/rbush.min.js"></script>
+    <script src="https://unpkg.com/deck.gl@9.1.0/dist.min.js"></script>
+    <script async src="https://maps.googleapis.com/maps/api/js?key={maps_key}&loading=async&callback=initMap"></script>
+    """
 
-supabase_client, gcs_bucket = initialize_backend()
+@st.cache_data(max_entries=64, show_spinner=False)
+def _location_messenger(location_json: str) -> str:
+    """Tiny script that pushes the captured location to the map iframe without remounting it."""
+    return f"""
+    <script>
+        window.trashguardLocation = {_script_json(location_json)};
+        const frames = window.parent.frames;
+        for (let i = 0; i < frames.length; i++) {{
+            frames[i].postMessage({{ type: 'trashguard-location', location: window.trashguardLocation }}, window.origin);
+        }}
+    </script>
+    """
 
 # --- Load Secrets ---
+@st.cache_resource(show_spinner=False)
+def _load_core_secrets() -> tuple[str, str, str, bool]:
+    """Reads the Maps key, map ID, CKAN resource ID and signed-URL flag once per process instead of on every rerun."""
+    # Advanced markers need a map ID; Google's DEMO_MAP_ID works until a real one is configured
+    return (st.secrets["MAPS_KEY"], st.secrets.get("MAPS_MAP_ID", "DEMO_MAP_ID"), st.secrets["CKAN_RID"],
+            bool(st.secrets.get("GCS_SIGNED_URLS")))
+
 try:
-    MAPS_API_KEY = st.secrets["MAPS_KEY"]
-    CKAN_RID = st.secrets["CKAN_RID"]
+    MAPS_API_KEY, MAPS_MAP_ID, CKAN_RID, GCS_SIGNED_URLS = _load_core_secrets()
     if not supabase_client or not gcs_bucket:
         st.error("Failed to initialize backend services (Supabase/GCS). Check secrets and logs.")
         st.stop()
@@ -58,6 +254,8 @@ except KeyError as e:
 # --- Session State Initialization ---
 if 'report_location' not in st.session_state:
     st.session_state.report_location = None
+if 'capturing_location' not in st.session_state:
+    st.session_state.capturing_location = False
 if 'success_message' not in st.session_state: # Initialize success message state
     st.session_state.success_message = None
 
@@ -67,83 +265,73 @@ if st.session_state.success_message:
     st.session_state.success_message = None # Clear after displaying
 
 # --- Load CKAN Data ---
+# Both calls are cheap cache hits on reruns, and pick up fresh CKAN data once CACHE_TTL expires
+record_count, hotspots_json = None, None
 try:
-    processed_df, hotspot_points = load_and_process_data(CKAN_RID)
+    record_count = load_record_count(CKAN_RID)
+    _, hotspots_json = load_binned_hotspots(CKAN_RID)
 except Exception as e:
     st.error(f"Error during initial data load: {e}")
     logger.error(f"Initial data load failed: {e}", exc_info=True)
-    processed_df = None
-    hotspot_points = None
 
 
 # --- Main UI ---
 st.title("♻️ TrashGuard San Jose")
 st.markdown("Visualizing hotspots & reporting illegal dumping with persistent storage.")
 
-if processed_df is not None:
-     st.metric(label="Illegal Dumping Reports (Last 90 Days, Processed)", value=f"{len(processed_df):,}")
+if record_count is not None:
+     st.metric(label="Illegal Dumping Reports (Last 90 Days, Processed)", value=f"{record_count:,}")
 else:
      st.metric(label="Illegal Dumping Reports (Last 90 Days, Processed)", value="Error loading")
 
 
 # --- Map & Geolocation ---
+# Fragment: the capture button and geolocation round-trips rerun only this section, not the whole page.
+# The map shell HTML is identical across reruns, so Streamlit keeps its iframe mounted either way.
+@st.fragment
+def _map_section(maps_key: str, map_id: str, hotspots_json: str):
+    st.write("Use the button below to capture your current location for the report.")
+    if st.button("📍 Capture my location", key="capture_location_button"):
+        st.session_state.capturing_location = True
+
+    # The geolocation component only renders once requested, so page load never waits on GPS/permissions
+    if st.session_state.capturing_location:
+        geo_loc = None
+        try:
+            with st.spinner("Waiting for location capture..."):
+                geo_loc = get_geolocation() # Returns None until the browser responds
+        except Exception as e:
+             st.warning(f"Could not render geolocation component: {e}")
+             st.session_state.capturing_location = False
+
+        if geo_loc and 'coords' in geo_loc:
+            st.session_state.report_location = {
+                "latitude": geo_loc['coords']['latitude'],
+                "longitude": geo_loc['coords']['longitude'],
+                "accuracy": geo_loc['coords']['accuracy'],
+                "timestamp": geo_loc['timestamp']
+            }
+            st.session_state.capturing_location = False
+            st.rerun() # Full rerun so the report form picks up the new location
+        elif geo_loc and 'error' in geo_loc:
+             st.warning(f"Could not get location: {geo_loc['error']}")
+             st.session_state.report_location = None
+             st.session_state.capturing_location = False
+
+    if st.session_state.report_location:
+        st.info(f"📍 Location captured: {st.session_state.report_location['latitude']:.5f}, {st.session_state.report_location['longitude']:.5f} (Accuracy: {st.session_state.report_location['accuracy']:.0f}m)") # Use st.info or just write
+
+    with st.container():
+        st.components.v1.html(_map_template(maps_key, map_id, hotspots_json), height=520)
+        st.components.v1.html(_location_messenger(json.dumps(st.session_state.report_location, sort_keys=True)), height=0)
+
 st.subheader("Illegal Dumping Heatmap & Report Location")
 if not MAPS_API_KEY:
     st.error("Google Maps API Key not found.")
-elif hotspot_points is None:
+elif hotspots_json is None:
     st.error("Failed to load heatmap data (CKAN fetch/process error).")
 else:
-    st.write("Use the button below to capture your current location for the report.")
-    geo_loc = None
-    try:
-        with st.spinner("Waiting for location capture..."):
-            geo_loc = get_geolocation() # Removed key
-    except Exception as e:
-         st.warning(f"Could not render geolocation component: {e}")
-
-    if geo_loc and 'coords' in geo_loc:
-        st.session_state.report_location = {
-            "latitude": geo_loc['coords']['latitude'],
-            "longitude": geo_loc['coords']['longitude'],
-            "accuracy": geo_loc['coords']['accuracy'],
-            "timestamp": geo_loc['timestamp']
-        }
-        st.info(f"📍 Location captured: {st.session_state.report_location['latitude']:.5f}, {st.session_state.report_location['longitude']:.5f} (Accuracy: {st.session_state.report_location['accuracy']:.0f}m)") # Use st.info or just write
-    elif geo_loc and 'error' in geo_loc:
-         st.warning(f"Could not get location: {geo_loc['error']}")
-         st.session_state.report_location = None
-
-    hotspots_json = json.dumps(hotspot_points)
-    map_html = f"""
-    <div id="map" style="height:500px; width:100%;"></div>
-    <script>
-        // ... (Map JS remains the same) ...
-        function initMap() {{
-            const sanJose = {{ lat: 37.3382, lng: -121.8863 }};
-            const map = new google.maps.Map(document.getElementById('map'), {{ zoom: 12, center: sanJose, mapTypeId: 'roadmap' }});
-            const heatmapData = {hotspots_json};
-            if (heatmapData && heatmapData.length > 0) {{
-                 const points = heatmapData.map(p => {{
-                     const lat = parseFloat(p.location.lat); const lng = parseFloat(p.location.lng);
-                     return (!isNaN(lat) && !isNaN(lng)) ? {{ location: new google.maps.LatLng(lat, lng), weight: p.weight }} : null;
-                 }}).filter(p => p !== null);
-                 if (points.length > 0) {{ new google.maps.visualization.HeatmapLayer({{ data: points, radius: 20, maxIntensity: 15, opacity: 0.75 }}).setMap(map); }}
-                 else {{ displayNoDataMessage(map, sanJose); }}
-            }} else {{ displayNoDataMessage(map, sanJose); }}
-             const currentLocation = {json.dumps(st.session_state.report_location)};
-             if (currentLocation && currentLocation.latitude) {{ /* ... (Marker JS) ... */
-                 const marker = new google.maps.Marker({{position: {{ lat: currentLocation.latitude, lng: currentLocation.longitude }}, map: map, title: `Captured Location (Accuracy: ${{currentLocation.accuracy?.toFixed(0)}}m)`}});
-                 map.setCenter({{ lat: currentLocation.latitude, lng: currentLocation.longitude }}); map.setZoom(16);
-                 const infowindow = new google.maps.InfoWindow({{ content: `Captured Location<br>Acc: ${{currentLocation.accuracy?.toFixed(0)}}m`}});
-                 marker.addListener('click', () => {{ infowindow.open(map, marker); }});
-             }}
-        }}
-        function displayNoDataMessage(map, position) {{ /* ... (same) ... */ }}
-    </script>
-    <script async defer src="https://maps.googleapis.com/maps/api/js?key={MAPS_API_KEY}&libraries=visualization&callback=initMap"></script>
-    """
-    with st.container():
-        st.components.v1.html(map_html, height=520)
+    _map_section(MAPS_API_KEY, MAPS_MAP_ID, hotspots_json)
 
 st.markdown("---")
 
@@ -155,8 +343,8 @@ with col1:
     uploaded_photo = st.file_uploader("1. Upload Photo:", type=["jpg", "png", "jpeg"], key="report_photo_uploader")
     if uploaded_photo: st.image(uploaded_photo, caption="Preview", width=200)
 with col2:
-    report_size = st.selectbox("2. Estimate Size:", ["<Select>", "Small", "Medium", "Large"], key="report_size_select")
-    report_type = st.selectbox("3. Main Type:", ["<Select>", "Household Bags", "Furniture", "Mattress", "E-waste", "Tires", "Construction", "Hazardous", "Yard Waste", "Other"], key="report_type_select")
+    report_size = st.selectbox("2. Estimate Size:", ["<Select>"] + REPORT_SIZES, key="report_size_select")
+    report_type = st.selectbox("3. Main Type:", ["<Select>"] + REPORT_TYPES, key="report_type_select")
     if st.session_state.report_location:
          st.write(f"✅ Using captured location.")
     else:
@@ -170,39 +358,42 @@ if st.button(submit_label, key="submit_report_button", disabled=not submit_ready
         with st.spinner("Submitting report..."):
             try:
                 report_id = str(uuid.uuid4())
-                image_extension = Path(uploaded_photo.name).suffix.lower()
-                if image_extension not in ['.jpg', '.jpeg', '.png']: image_extension = '.jpg'
-
-                logger.info(f"Uploading photo for report {report_id}...")
-                image_url, gcs_path, storage_error = upload_photo(gcs_bucket, report_id, uploaded_photo, image_extension)
-
-                if storage_error:
-                    st.error(f"Failed to upload image: {storage_error}")
+                # Object path and URL are deterministic, so the DB row doesn't have to wait for
+                # compression or the upload
+                image_extension = _photo_extension(uploaded_photo)
+                image_url, gcs_path = photo_location(gcs_bucket, report_id, image_extension)
+                report_data = {
+                    "report_id": report_id, "report_size": report_size, "report_type": report_type,
+                    "image_url": image_url, "gcs_path": gcs_path, "original_filename": uploaded_photo.name,
+                    "status": "New", "latitude": None, "longitude": None, "location_accuracy": None}
+                if st.session_state.report_location:
+                    report_data["latitude"] = st.session_state.report_location['latitude']
+                    report_data["longitude"] = st.session_state.report_location['longitude']
+                    report_data["location_accuracy"] = st.session_state.report_location['accuracy']
+
+                logger.info(f"Uploading photo and inserting metadata for report {report_id}...")
+                executor = _io_executor()
+                upload_future = executor.submit(_compress_and_upload, gcs_bucket, report_id, uploaded_photo, image_extension)
+                insert_future = executor.submit(insert_report, supabase_client, report_data)
+                _, _, storage_error = upload_future.result()
+                inserted_id, db_error = insert_future.result()
+
+                if storage_error or db_error:
+                    if storage_error: st.error(f"Failed to upload image: {storage_error}")
+                    if db_error: st.error(f"Failed to save report metadata: {db_error}")
+                    # Roll back whichever half succeeded, without making the user wait on it
+                    if not storage_error:
+                        logger.warning("Deleting orphaned image from storage in the background...")
+                        executor.submit(_cleanup_orphaned_photo, gcs_bucket, gcs_path)
+                    if not db_error:
+                        logger.warning("Deleting report metadata without an image in the background...")
+                        executor.submit(_rollback_report_metadata, supabase_client, report_id)
                 else:
-                    report_data = { # Prepare data... (same as before)
-                        "report_id": report_id, "report_size": report_size, "report_type": report_type,
-                        "image_url": image_url, "gcs_path": gcs_path, "original_filename": uploaded_photo.name,
-                        "status": "New", "latitude": None, "longitude": None, "location_accuracy": None}
-                    if st.session_state.report_location:
-                        report_data["latitude"] = st.session_state.report_location['latitude']
-                        report_data["longitude"] = st.session_state.report_location['longitude']
-                        report_data["location_accuracy"] = st.session_state.report_location['accuracy']
-
-                    logger.info(f"Inserting metadata for report {report_id} into Supabase...")
-                    inserted_id, db_error = insert_report(supabase_client, report_data)
-
-                    if db_error:
-                        st.error(f"Failed to save report metadata: {db_error}")
-                        logger.warning("Attempting to delete orphaned image from storage...")
-                        deleted, del_err = delete_photo(gcs_bucket, gcs_path)
-                        if del_err: st.error(f"Failed to delete orphaned image: {del_err}")
-                        else: st.info("Orphaned image deleted.")
-                    else:
-                        # <<< SUCCESS MESSAGE HANDLING: Store message >>>
-                        st.session_state.success_message = f"✅ Report submitted successfully! (ID: {inserted_id[:8]}...)"
-                        st.session_state.report_location = None # Clear location state
-                        logger.info("Report submission successful, preparing rerun...")
-                        st.rerun() # Rerun immediately
+                    # <<< SUCCESS MESSAGE HANDLING: Store message >>>
+                    st.session_state.success_message = f"✅ Report submitted successfully! (ID: {inserted_id[:8]}...)"
+                    st.session_state.report_location = None # Clear location state
+                    logger.info("Report submission successful, preparing rerun...")
+                    st.rerun() # Rerun immediately
 
             except Exception as e:
                  st.error(f"An unexpected error occurred during submission: {e}")
@@ -216,6 +407,7 @@ st.markdown("---")
 st.sidebar.title("Admin Panel")
 admin_password = st.sidebar.text_input("Enter Admin Password:", type="password", key="admin_pass")
 DEMO_PASSWORD = "admin"
+REPORTS_PAGE_SIZE = 50
 
 if admin_password == DEMO_PASSWORD:
     if not supabase_client or not gcs_bucket:
@@ -224,40 +416,54 @@ if admin_password == DEMO_PASSWORD:
         st.sidebar.success("Access Granted")
         st.sidebar.subheader("Submitted Reports")
 
-        reports, fetch_error = fetch_reports(supabase_client)
-
-        if fetch_error:
+        # The DB is only queried once the admin asks for the list
+        if st.sidebar.button("Load reports", key="load_reports"):
+            st.session_state["reports_loaded"] = True
+
+        admin_view, fetch_error = None, None
+        if st.session_state.get("reports_loaded"):
+            status_filter = st.sidebar.selectbox("Filter by Status:", ["All"] + REPORT_STATUSES, key="admin_status_filter")
+            # Keyset pagination: one (created_at, report_id) cursor per visited page, reset when the filter changes
+            if st.session_state.get("admin_cursor_filter") != status_filter:
+                st.session_state.admin_cursor_filter = status_filter
+                st.session_state.admin_cursors = [None]
+            cursors = st.session_state.admin_cursors
+            page = len(cursors)
+            admin_view, next_cursor, fetch_error = _fetch_admin_view(
+                supabase_client, limit=REPORTS_PAGE_SIZE, before_cursor=cursors[-1],
+                status=None if status_filter == "All" else status_filter)
+
+            col_newer, col_older = st.sidebar.columns(2)
+            if col_newer.button("◀ Newer", key="admin_page_newer", disabled=page == 1):
+                cursors.pop()
+                st.rerun()
+            if col_older.button("Older ▶", key="admin_page_older", disabled=next_cursor is None):
+                cursors.append(next_cursor)
+                st.rerun()
+            st.sidebar.caption(f"Page {page}")
+
+        if not st.session_state.get("reports_loaded"):
+            st.sidebar.caption("Click 'Load reports' to fetch submitted reports.")
+        elif fetch_error:
             st.sidebar.error(f"Error fetching reports: {fetch_error}")
-        elif not reports:
+        elif not admin_view:
             st.sidebar.info("No reports found.")
         else:
-            report_data_display = []
-            report_details = {}
-
-            for report in reports: # Process fetched reports... (same as before)
-                report_id = report["report_id"]; report_details[report_id] = report
-                ts_dt = report.get("created_at_dt")
-                time_str = ts_dt.strftime('%Y-%m-%d %H:%M UTC') if isinstance(ts_dt, datetime.datetime) else report.get("created_at", "N/A")[:16]
-                lat = report.get("latitude"); lon = report.get("longitude")
-                loc_str = f"{lat:.4f}, {lon:.4f}" if lat is not None and lon is not None else "-"
-                report_data_display.append({
-                    "Report ID": report_id[:8], "Time": time_str, "Status": report.get("status", "N/A"),
-                    "Size": report.get("report_size", "N/A"), "Type": report.get("report_type", "N/A"),
-                    "Location": loc_str, "_doc_id": report_id })
-
-            if report_data_display:
-                 report_df = pd.DataFrame(report_data_display).set_index("_doc_id")
-                 cols_to_display = ["Report ID", "Time", "Status", "Size", "Type", "Location"]
-                 st.sidebar.dataframe(report_df[cols_to_display], use_container_width=True)
+            report_details, report_df, display_labels, report_ids = admin_view
+
+            if report_details:
+                 st.sidebar.dataframe(report_df, use_container_width=True, column_config={
+                     "Time": st.column_config.DatetimeColumn(format="YYYY-MM-DD HH:mm", timezone="UTC"),
+                     "Lat": st.column_config.NumberColumn(format="%.4f"),
+                     "Lng": st.column_config.NumberColumn(format="%.4f"),
+                 })
 
                  st.sidebar.subheader("Manage Report")
-                 report_ids_list = ["<Select Report>"] + list(report_details.keys())
-                 display_id_map = {"<Select Report>": "<Select Report>"}
-                 display_id_map.update({f"{rid[:8]}... ({report_details[rid].get('created_at_dt','').strftime('%H:%M') if report_details[rid].get('created_at_dt') else ''})": rid for rid in report_ids_list[1:]})
-                 selected_display_id = st.sidebar.selectbox("Select Report:", list(display_id_map.keys()), key="admin_select_supabase")
-                 selected_report_id = display_id_map[selected_display_id]
+                 selected_idx = st.sidebar.selectbox("Select Report:", range(len(display_labels)), format_func=display_labels.__getitem__,
+                                                     key=f"admin_select_supabase_{status_filter}_{page}")
+                 selected_report_id = report_ids[selected_idx]
 
-                 if selected_report_id != "<Select Report>":
+                 if selected_report_id is not None:
                     selected_data = report_details.get(selected_report_id)
                     if selected_data: # Display details... (same as before)
                         st.sidebar.caption(f"Details for: {selected_report_id[:8]}...")
@@ -265,55 +471,62 @@ if admin_password == DEMO_PASSWORD:
                         st.sidebar.text(f"Size: {selected_data.get('report_size')}")
                         # ... (rest of details display) ...
                         img_url = selected_data.get("image_url")
+                        if img_url and GCS_SIGNED_URLS:
+                            # Private bucket: sign the whole page at once (cached) and look this report up
+                            page_paths = tuple(report_details[rid].get("gcs_path") or "" for rid in report_ids[1:])
+                            img_url = dict(zip(report_ids[1:], sign_urls(gcs_bucket, page_paths))).get(selected_report_id)
                         if img_url: st.sidebar.image(img_url, caption=f"Image", use_column_width=True)
                         else: st.sidebar.text("No image URL found.")
 
 
+                        # Widgets use stable keys; reset the status picker when a different report is selected
+                        if st.session_state.get("admin_selected_id") != selected_report_id:
+                            st.session_state.admin_selected_id = selected_report_id
+                            st.session_state.pop("admin_status_select", None)
+
                         col1a, col2a = st.sidebar.columns(2)
                         current_status = selected_data.get('status', 'New')
-                        status_options = ['New', 'Reviewed', 'Cleaned']
+                        status_options = REPORT_STATUSES
                         try: current_status_index = status_options.index(current_status)
                         except ValueError: current_status_index = 0
 
                         with col1a: # Update Status
-                            new_status = st.selectbox("Set Status:", status_options, index=current_status_index, key=f"status_{selected_report_id}")
-                            if st.button("Update Status", key=f"update_{selected_report_id}"):
+                            new_status = st.selectbox("Set Status:", status_options, index=current_status_index, key="admin_status_select")
+                            if st.button("Update Status", key="admin_update_status"):
                                 if new_status != current_status:
                                     success, error = update_report_status(supabase_client, selected_report_id, new_status)
                                     if error: st.error(f"Update failed: {error}")
                                     else:
                                         # <<< SUCCESS MESSAGE HANDLING: Store message >>>
                                         st.session_state.success_message = f"✅ Status updated to {new_status} for report {selected_report_id[:8]}..."
-                                        time.sleep(0.5); st.rerun()
+                                        st.rerun()
                                 else: st.info("Status is already set to that value.")
 
                         with col2a: # Delete
-                            if f"confirm_delete_{selected_report_id}" not in st.session_state: st.session_state[f"confirm_delete_{selected_report_id}"] = False
-                            if st.session_state[f"confirm_delete_{selected_report_id}"]:
+                            # One session entry holds the report awaiting delete confirmation
+                            if st.session_state.get("confirm_delete_id") == selected_report_id:
                                 st.warning("Are you sure?")
-                                if st.button("YES, DELETE", key=f"delete_confirm_{selected_report_id}"):
+                                if st.button("YES, DELETE", key="admin_delete_confirm"):
                                     with st.spinner("Deleting..."):
                                         logger.info(f"Attempting deletion for report {selected_report_id}...")
-                                        meta_deleted, meta_err = delete_report_metadata(supabase_client, selected_report_id)
+                                        gcs_path = selected_data.get("gcs_path")
+                                        (meta_deleted, meta_err), (photo_deleted, photo_err) = _delete_report(
+                                            gcs_bucket, supabase_client, selected_report_id, gcs_path)
+                                        if photo_err: st.error(f"Failed to delete image: {photo_err}")
+                                        elif photo_deleted: logger.info("Image deleted from storage.")
+                                        elif not gcs_path: st.warning("No GCS path in record.")
                                         if meta_err: st.error(f"Failed to delete DB record: {meta_err}")
                                         else:
-                                            logger.info("DB record deleted. Attempting GCS delete...")
-                                            gcs_path = selected_data.get("gcs_path")
-                                            if gcs_path:
-                                                photo_deleted, photo_err = delete_photo(gcs_bucket, gcs_path)
-                                                if photo_err: st.error(f"Failed to delete image: {photo_err}")
-                                                else: logger.info("Image deleted from storage.")
-                                            else: st.warning("No GCS path in record.")
                                             # <<< SUCCESS MESSAGE HANDLING: Store message >>>
                                             st.session_state.success_message = f"✅ Report {selected_report_id[:8]}... deleted."
-                                            st.session_state[f"confirm_delete_{selected_report_id}"] = False # Reset confirm state
-                                            time.sleep(1); st.rerun()
-                                if st.button("Cancel", key=f"delete_cancel_{selected_report_id}"):
-                                    st.session_state[f"confirm_delete_{selected_report_id}"] = False
+                                            st.session_state.pop("confirm_delete_id", None) # Reset confirm state
+                                            st.rerun()
+                                if st.button("Cancel", key="admin_delete_cancel"):
+                                    st.session_state.pop("confirm_delete_id", None)
                                     st.rerun()
                             else:
-                                if st.button("🚨 Delete Report", key=f"delete_init_{selected_report_id}"):
-                                    st.session_state[f"confirm_delete_{selected_report_id}"] = True
+                                if st.button("🚨 Delete Report", key="admin_delete_init"):
+                                    st.session_state["confirm_delete_id"] = selected_report_id
                                     st.rerun()
                     else: st.sidebar.error("Selected report details not found.")
             else: # Handles case where reports list is empty but not None
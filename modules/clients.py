@@ -0,0 +1,28 @@
+# modules/clients.py
+import streamlit as st
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import logging
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from .db_handler import init_supabase, create_http_client
+from .storage_handler import init_gcs
+
+logger = logging.getLogger(__name__)
+
+@st.cache_resource
+def init_clients() -> SimpleNamespace:
+    """
+    Initializes every backend client once per process and returns them together:
+    `supabase` (Client), `bucket` (GCS Bucket) and `http` (the httpx client behind Supabase).
+    A member is None if its initialization failed.
+    """
+    logger.info("Attempting to initialize backend services...")
+    http = create_http_client()
+    # Supabase and GCS handshakes are independent; run them side by side.
+    # Worker threads inherit the script context so st.error() inside the init functions still renders.
+    ctx = get_script_run_ctx()
+    with ThreadPoolExecutor(max_workers=2, initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx)) as executor:
+        supabase_future = executor.submit(init_supabase, http)
+        gcs_future = executor.submit(init_gcs)
+        return SimpleNamespace(supabase=supabase_future.result(), bucket=gcs_future.result(), http=http)
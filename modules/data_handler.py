@@ -1,52 +1,142 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pandas as pd
 import datetime
-import json
+import orjson
 import numpy as np
 import logging
+import tempfile
+import os
+import time
+from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
 CKAN_URL_BASE = "https://data.sanjoseca.gov"
 SQL_ENDPOINT = "/api/3/action/datastore_search_sql"
 CACHE_TTL = 6 * 60 * 60
+CKAN_COLUMNS = ("Latitude", "Longitude", "Status", "Date Created")
+HEATMAP_GRID_SCALE = 500 # Heatmap tiles are 1/500 degree (~200m)
 
-@st.cache_data(ttl=CACHE_TTL)
-def load_and_process_data(resource_id: str) -> tuple[pd.DataFrame | None, list | None]:
+# Keep-alive session so a cache-miss refetch reuses the TLS connection; retries transient gateway errors
+_ckan_session = requests.Session()
+_ckan_session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=1,
+                                            max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(502, 503, 504))))
+
+def _snapshot_path(resource_id: str) -> Path:
+    return Path(tempfile.gettempdir()) / f"ckan_{resource_id}.parquet"
+
+def _read_snapshot(resource_id: str) -> pd.DataFrame | None:
+    """Returns the processed DataFrame saved by a previous process, if it is younger than CACHE_TTL."""
+    path = _snapshot_path(resource_id)
+    try:
+        if path.exists() and time.time() - path.stat().st_mtime < CACHE_TTL:
+            df = pd.read_parquet(path)
+            logger.info(f"Loaded {len(df)} processed records from snapshot {path}.")
+            return df
+    except Exception as e:
+        logger.warning(f"Could not read CKAN snapshot {path}: {e}")
+    return None
+
+def _write_snapshot(df: pd.DataFrame, resource_id: str) -> None:
+    """Persists the processed DataFrame so a cold start can skip the CKAN fetch and parse."""
+    path = _snapshot_path(resource_id)
+    tmp_path = None
+    try:
+        # Write beside the target, then rename over it, so a concurrent reader never sees a partial file
+        with tempfile.NamedTemporaryFile(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp", delete=False) as tmp:
+            tmp_path = tmp.name
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        logger.warning(f"Could not write CKAN snapshot {path}: {e}")
+        if tmp_path and os.path.exists(tmp_path): os.remove(tmp_path)
+
+def _date_cutoff() -> datetime.datetime:
+    """Start of the 90-day reporting window."""
+    return datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=90)
+
+def _aggregate_tiles(ilat: np.ndarray, ilon: np.ndarray, weights: np.ndarray | None, scale: int) -> dict:
+    """
+    Sums weights per integer (lat, lng) tile and returns the flat heatmap payload:
+    {"lat": [...], "lng": [...], "w": [...], "scale": scale}, where degrees = index / scale.
     """
-    Fetches illegal dumping data using CKAN SQL endpoint (filtering only by Service Type)
-    and then filters by date using Pandas for robustness.
+    # Pack both tile indices into one int64 key, then integer factorize -> bincount
+    packed = (ilat.astype(np.int64) << 32) | (ilon.astype(np.int64) & 0xFFFFFFFF)
+    keys, inverse = np.unique(packed, return_inverse=True)
+    sums = np.bincount(inverse, weights=weights)
+    return {
+        "lat": (keys >> 32).astype(np.int32).tolist(),
+        "lng": keys.astype(np.int32).tolist(), # Low 32 bits, reinterpreted as signed
+        "w": sums.astype(np.int64).tolist(),
+        "scale": scale,
+    }
+
+def _empty_hotspots() -> dict:
+    return {"lat": [], "lng": [], "w": [], "scale": HEATMAP_GRID_SCALE}
+
+def _build_heatmap(df: pd.DataFrame, lat_col: str = "Latitude", lon_col: str = "Longitude") -> tuple[pd.DataFrame | None, dict | None]:
+    """Grid & Weight for Heatmap: counts cleaned records per ~200m tile (1/500 degree)."""
+    try:
+        ilat = np.round(df[lat_col].to_numpy(np.float32) * float(HEATMAP_GRID_SCALE)).astype(np.int32)
+        ilon = np.round(df[lon_col].to_numpy(np.float32) * float(HEATMAP_GRID_SCALE)).astype(np.int32)
+        hotspots_data = _aggregate_tiles(ilat, ilon, None, HEATMAP_GRID_SCALE)
+        max_weight = 15
+        hotspots_data["w"] = np.minimum(hotspots_data["w"], max_weight).tolist()
+        logger.info(f"Data processed: {len(df)} final records, {len(hotspots_data['w'])} hotspots.")
+        return df, hotspots_data
+
+    except Exception as e:
+        st.error(f"Error creating heatmap data: {e}")
+        logger.error(f"Heatmap processing error: {e}", exc_info=True)
+        return None, None
+
+
+# Not persist="disk": Streamlit ignores ttl for persisted caches, and the parquet snapshot
+# already covers restarts while still expiring after CACHE_TTL.
+@st.cache_data(ttl=CACHE_TTL, show_spinner="Loading CKAN data…")
+def load_and_process_data(resource_id: str) -> tuple[pd.DataFrame | None, dict | None]:
+    """
+    Fetches illegal dumping data using CKAN SQL endpoint (filtering by Service Type and a
+    day-rounded 90-day cutoff) and then re-checks the date window in Pandas for robustness.
     Uses correct column names like "Date Created", "Service Type", "Latitude", "Longitude".
-    Returns the processed DataFrame and a list of hotspot data points.
+    Returns the processed DataFrame and the hotspot payload (flat lat/lng/weight arrays).
+    A parquet snapshot of the processed DataFrame lets a fresh process skip the fetch within CACHE_TTL.
     """
-    logger.info(f"Fetching data via SQL (Service Type filter only) from CKAN Resource ID: {resource_id}")
+    logger.info(f"Fetching data via SQL (Service Type + date filter) from CKAN Resource ID: {resource_id}")
     if not resource_id:
         st.error("CKAN Resource ID not found in secrets.")
         return None, None
 
+    snapshot_df = _read_snapshot(resource_id)
+    if snapshot_df is not None:
+        # The snapshot can be up to CACHE_TTL old; drop rows that have since aged out of the window
+        return _build_heatmap(snapshot_df[snapshot_df['created_datetime'] >= _date_cutoff()].reset_index(drop=True))
+
+    # Rounded to the day so the query text only changes once per day
+    sql_cutoff = _date_cutoff().strftime('%Y-%m-%d')
     sql_query = f"""
     SELECT
-        "Latitude",
-        "Longitude",
-        "Status",
-        "Date Created"
+        {", ".join(f'"{col}"' for col in CKAN_COLUMNS)}
     FROM
         "{resource_id}"
     WHERE
         "Service Type" = 'Illegal Dumping'
+        AND "Date Created" >= '{sql_cutoff}'::timestamp
     LIMIT 100000
     """
     logger.info(f"Executing CKAN SQL Query:\n{sql_query}")
 
     try:
-        response = requests.get(
+        response = _ckan_session.get(
             f"{CKAN_URL_BASE}{SQL_ENDPOINT}",
             params={'sql': sql_query},
             timeout=60
         )
         response.raise_for_status()
-        data = response.json()
+        data = orjson.loads(response.content) # Decode the raw bytes directly, skipping response.text
 
         if not data.get('success'):
             error_details = data.get('error', {})
@@ -58,14 +148,16 @@ def load_and_process_data(resource_id: str) -> tuple[pd.DataFrame | None, list |
         records = data.get("result", {}).get("records", [])
         if not records:
             st.warning("No 'Illegal Dumping' records found via SQL based on 'Service Type'.")
-            return pd.DataFrame(), [] # Return empty, not None
+            return pd.DataFrame(), _empty_hotspots() # Return empty, not None
 
     except Exception as e:
         st.error(f"CKAN Fetch Error: {e}")
         logger.error(f"CKAN Fetch Error: {e}", exc_info=True)
         return None, None
 
-    df = pd.DataFrame(records)
+    # Build column lists directly rather than letting pandas infer a schema from every record dict
+    columns = [col for col in CKAN_COLUMNS if col in records[0]]
+    df = pd.DataFrame({col: [record.get(col) for record in records] for col in columns})
     initial_record_count = len(df)
     logger.info(f"Fetched {initial_record_count} raw 'Illegal Dumping' records via SQL.")
 
@@ -75,7 +167,8 @@ def load_and_process_data(resource_id: str) -> tuple[pd.DataFrame | None, list |
         st.error(f"Critical '{date_col}' column missing. Cannot filter by date.")
         return None, None
     try:
-        df['created_datetime'] = pd.to_datetime(df[date_col], errors='coerce')
+        # Explicit ISO8601 format keeps parsing on the vectorized path instead of per-row inference
+        df['created_datetime'] = pd.to_datetime(df[date_col], format='ISO8601', utc=True, errors='coerce')
         original_rows = len(df)
         df.dropna(subset=['created_datetime'], inplace=True)
         valid_date_rows = len(df)
@@ -83,16 +176,13 @@ def load_and_process_data(resource_id: str) -> tuple[pd.DataFrame | None, list |
             st.warning(f"Could not parse '{date_col}' for {original_rows - valid_date_rows} rows.")
         if df.empty:
             st.warning(f"No records remaining after parsing '{date_col}'.")
-            return pd.DataFrame(), []
+            return pd.DataFrame(), _empty_hotspots()
 
-        cutoff_date = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=90)
-        if df['created_datetime'].dt.tz is None:
-            cutoff_date = cutoff_date.replace(tzinfo=None)
-        df = df[df['created_datetime'] >= cutoff_date].copy()
+        df = df[df['created_datetime'] >= _date_cutoff()].copy()
         logger.info(f"Filtered down to {len(df)} records within the last 90 days using Pandas.")
         if df.empty:
             st.warning("No 'Illegal Dumping' records found within the last 90 days.")
-            return pd.DataFrame(), []
+            return pd.DataFrame(), _empty_hotspots()
 
     except Exception as e:
         st.error(f"Error processing dates: {e}")
@@ -104,33 +194,49 @@ def load_and_process_data(resource_id: str) -> tuple[pd.DataFrame | None, list |
     if not all(col in df.columns for col in [lat_col, lon_col]):
          st.error(f"Critical '{lat_col}' or '{lon_col}' column missing.")
          return None, None
-    df[lat_col] = pd.to_numeric(df[lat_col], errors='coerce')
-    df[lon_col] = pd.to_numeric(df[lon_col], errors='coerce')
+    # float32 (~1m precision at these coordinates) halves memory traffic through the grid step
+    df[lat_col] = pd.to_numeric(df[lat_col], errors='coerce', downcast='float').astype(np.float32)
+    df[lon_col] = pd.to_numeric(df[lon_col], errors='coerce', downcast='float').astype(np.float32)
     original_rows_before_latlon_drop = len(df)
     df.dropna(subset=[lat_col, lon_col], inplace=True)
     if len(df) < original_rows_before_latlon_drop:
          logger.info(f"Dropped {original_rows_before_latlon_drop - len(df)} rows missing valid lat/lon.")
     if df.empty:
         st.warning("No records with valid latitude/longitude found.")
-        return pd.DataFrame(), []
+        return pd.DataFrame(), _empty_hotspots()
 
-    # Grid & Weight for Heatmap
-    try:
-        df = df.assign(
-            tile=list(zip(np.round(df[lat_col] * 500), np.round(df[lon_col] * 500)))
-        )
-        heat_df = df.groupby("tile").size().reset_index(name="cnt")
-        heat_df["lat"] = heat_df["tile"].apply(lambda t: t[0] / 500)
-        heat_df["lng"] = heat_df["tile"].apply(lambda t: t[1] / 500)
-        max_weight = 15
-        hotspots_data = [
-            {"location": {"lat": row.lat, "lng": row.lng}, "weight": min(row.cnt, max_weight)}
-            for row in heat_df.itertuples()
-        ]
-        logger.info(f"Data processed: {len(df)} final records, {len(hotspots_data)} hotspots.")
-        return df, hotspots_data
+    _write_snapshot(df, resource_id)
+    return _build_heatmap(df)
 
-    except Exception as e:
-        st.error(f"Error creating heatmap data: {e}")
-        logger.error(f"Heatmap processing error: {e}", exc_info=True)
-        return None, None
\ No newline at end of file
+
+def bin_hotspots(hotspots: dict, precision: int = 2) -> dict:
+    """
+    Aggregates a hotspot payload onto a coarser lat/lng grid (rounded to `precision` decimals),
+    summing the weights of all tiles that fall into the same cell.
+    """
+    scale = 10 ** precision
+    factor = scale / hotspots["scale"]
+    ilat = np.round(np.asarray(hotspots["lat"], dtype=np.float64) * factor).astype(np.int32)
+    ilon = np.round(np.asarray(hotspots["lng"], dtype=np.float64) * factor).astype(np.int32)
+    return _aggregate_tiles(ilat, ilon, np.asarray(hotspots["w"], dtype=np.float64), scale)
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def load_record_count(resource_id: str) -> int | None:
+    """Number of processed CKAN records; cached so reruns don't deserialize the DataFrame for one number."""
+    processed_df, _ = load_and_process_data(resource_id)
+    return len(processed_df) if processed_df is not None else None
+
+# cache_resource, not cache_data: every rerun reads this, and a hit hands back the same
+# objects instead of unpickling a multi-MB payload. Callers must not mutate the result.
+@st.cache_resource(ttl=CACHE_TTL, show_spinner=False)
+def load_binned_hotspots(resource_id: str) -> tuple[dict | None, str | None]:
+    """
+    Returns the heatmap points at two zoom levels: "city" (binned to ~1km cells) and
+    "neighborhood" (the original ~200m tiles), plus their JSON serialization.
+    Cached per resource ID so binning and serialization run once per CKAN refresh.
+    """
+    _, hotspot_points = load_and_process_data(resource_id)
+    if hotspot_points is None:
+        return None, None
+    levels = {"city": bin_hotspots(hotspot_points, precision=2), "neighborhood": hotspot_points}
+    return levels, orjson.dumps(levels).decode() # Compact output, several times faster than json.dumps
@@ -1,93 +1,247 @@
 import streamlit as st
-from supabase import create_client, Client
-import datetime
+from supabase import create_client, Client, ClientOptions
+import httpx
+import orjson
+import pandas as pd
+from itertools import islice
 from .utils import DB_TABLE_REPORTS
+import asyncio
+import threading
+import time
+from urllib.parse import urlsplit
 import logging
 
+try:
+    import asyncpg # Optional direct Postgres path, used when SUPABASE_DB_URL is configured
+except ImportError:
+    asyncpg = None
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+logging.getLogger("httpx").setLevel(logging.WARNING) # Silence per-request lines from the Supabase HTTP client
+
+# Column order matters for INSERT_SQL; the frozensets make per-row checks set operations
+REPORT_DB_FIELDS = ('report_id', 'report_size', 'report_type', 'image_url', 'gcs_path',
+                    'original_filename', 'status', 'latitude', 'longitude', 'location_accuracy')
+_REQUIRED = frozenset({'report_id', 'report_size', 'report_type', 'image_url', 'gcs_path', 'status'})
+_ALLOWED = frozenset(REPORT_DB_FIELDS)
+# Columns list views need; avoids shipping any wide columns added later
+REPORT_LIST_COLUMNS = "report_id,report_size,report_type,image_url,gcs_path,original_filename,status,latitude,longitude,created_at"
+INSERT_BATCH_SIZE = 500 # Rows per insert request, well under PostgREST's payload limit
+
+PG_TIMEOUT = 30 # Seconds to wait on a direct Postgres call
+PG_RETRY_INTERVAL = 300 # Seconds to stay on PostgREST after a pool fails to open before trying again
+# Supavisor serves both modes from the same host: session mode keeps a backend per client connection
+# (prepared statements work), transaction mode multiplexes clients per statement (no prepared statements)
+PG_POOL_CONFIG = {
+    "session": (5432, {"min_size": 3, "max_size": 5, "statement_cache_size": 1024}),
+    "transaction": (6543, {"min_size": 2, "max_size": 10, "statement_cache_size": 0}),
+}
+# One statement per batch: rows arrive as a JSON array and take their column types from the table.
+# RETURNING lists only rows actually written, so skipped duplicates can be told apart.
+INSERT_SQL = f"INSERT INTO {DB_TABLE_REPORTS} ({', '.join(REPORT_DB_FIELDS)}) " \
+             f"SELECT {', '.join(REPORT_DB_FIELDS)} FROM jsonb_populate_recordset(NULL::{DB_TABLE_REPORTS}, $1::jsonb) " \
+             f"ON CONFLICT (report_id) DO NOTHING RETURNING report_id"
+UPDATE_STATUS_SQL = f"UPDATE {DB_TABLE_REPORTS} SET status = $1 WHERE report_id = $2"
+DELETE_REPORT_SQL = f"DELETE FROM {DB_TABLE_REPORTS} WHERE report_id = $1"
+DELETE_REPORTS_SQL = f"DELETE FROM {DB_TABLE_REPORTS} WHERE report_id = ANY($1) RETURNING report_id"
+_reports_changed_hook = None # See set_reports_changed_hook()
+DELETE_BATCH_SIZE = 500 # IDs per delete request; keeps the PostgREST URL under the pooler's length cap
+
+class _OrjsonResponse(httpx.Response):
+    """httpx response whose .json() (what postgrest calls on every reply) is decoded by orjson."""
+    def json(self, **kwargs):
+        return orjson.loads(self.content)
+
+class _OrjsonTransport(httpx.HTTPTransport):
+    """HTTP transport that hands back _OrjsonResponse objects."""
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        response = super().handle_request(request)
+        response.__class__ = _OrjsonResponse
+        return response
+
+def create_http_client() -> httpx.Client:
+    """
+    Long-lived HTTP/2 client for Supabase, so reruns multiplex over a warm connection instead of
+    paying a fresh TLS handshake whenever the pool goes idle. The transport also decodes with orjson.
+    """
+    transport = _OrjsonTransport(http2=True, limits=httpx.Limits(max_keepalive_connections=20, keepalive_expiry=300))
+    return httpx.Client(transport=transport, timeout=30)
 
-@st.cache_resource # Cache the Supabase client connection
-def init_supabase() -> Client | None:
-    """Initializes and returns the Supabase client."""
+def init_supabase(http_client: httpx.Client | None = None) -> Client | None:
+    """Initializes and returns the Supabase client. Cached once per process by clients.init_clients()."""
     try:
         url = st.secrets["SUPABASE_URL"]
         key = st.secrets["SUPABASE_SERVICE_KEY"]
         logger.info("Initializing Supabase client...")
-        client = create_client(url, key)
-        
+        client = create_client(url, key, options=ClientOptions(httpx_client=http_client or create_http_client()))
+        # Open the direct Postgres pools (if configured) in parallel on background threads, so startup
+        # doesn't wait on the handshakes; a write that arrives first waits only for its own pool
+        for mode in PG_POOL_CONFIG:
+            threading.Thread(target=_pg_pool, args=(mode,), name=f"pg-pool-warm-{mode}", daemon=True).start()
         logger.info("Supabase client initialized.")
         return client
     except KeyError as e:
         st.error(f"🔥 Missing Supabase secret: {e}. Check Streamlit secrets.")
-        logger.error(f"Missing Supabase secret: {e}")
+        logger.error("Missing Supabase secret: %s", e)
         return None
     except Exception as e:
         st.error(f"🔥 Supabase initialization failed: {e}")
-        logger.error(f"Supabase init error: {e}", exc_info=True)
+        logger.error("Supabase init error: %s", e, exc_info=True)
         return None
 
-def insert_report(supabase: Client, report_data: dict) -> tuple[str | None, str | None]:
-    """Inserts a report into the Supabase database."""
-    if not supabase: return None, "Supabase client not initialized."
+@st.cache_resource
+def _pg_loop() -> asyncio.AbstractEventLoop:
+    """Event loop on a background thread that owns the asyncpg pools, so sync callers can share them."""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="pg-pool-loop", daemon=True).start()
+    return loop
+
+@st.cache_resource
+def _get_pg_pool(mode: str) -> tuple[asyncio.AbstractEventLoop, "asyncpg.Pool"] | None:
+    """
+    Returns (event loop, asyncpg pool) for a Supavisor pooling `mode` ("session" or "transaction"),
+    or None if no direct connection is configured. Raises if the pool can't be opened, so the
+    failure isn't cached.
+    """
+    dsn = st.secrets.get("SUPABASE_DB_URL")
+    if not dsn or asyncpg is None: return None
+    port, pool_kwargs = PG_POOL_CONFIG[mode]
+    parts = urlsplit(dsn)
+    host = parts.netloc.rsplit(":", 1)[0] if parts.port else parts.netloc
+    logger.info("Initializing direct Postgres %s pool...", mode)
+    pool = asyncio.run_coroutine_threadsafe(
+        asyncpg.create_pool(dsn=parts._replace(netloc=f"{host}:{port}").geturl(), **pool_kwargs), _pg_loop()
+    ).result(timeout=PG_TIMEOUT)
+    logger.info("Direct Postgres %s pool initialized.", mode)
+    return _pg_loop(), pool
+
+_pg_pool_failed_at: dict[str, float] = {}
+
+def _pg_pool(mode: str) -> tuple[asyncio.AbstractEventLoop, "asyncpg.Pool"] | None:
+    """Returns the `mode` pool from _get_pg_pool(), or None to use PostgREST while it can't be opened."""
+    if time.monotonic() - _pg_pool_failed_at.get(mode, float("-inf")) < PG_RETRY_INTERVAL: return None
     try:
-        required = ['report_id', 'report_size', 'report_type', 'image_url', 'gcs_path', 'status']
-        if not all(k in report_data for k in required):
-            missing = [k for k in required if k not in report_data]
-            return None, f"Missing required fields for DB insert: {missing}"
+        return _get_pg_pool(mode)
+    except Exception as e:
+        _pg_pool_failed_at[mode] = time.monotonic()
+        logger.error("Direct Postgres %s pool init failed, falling back to PostgREST: %s", mode, e, exc_info=True)
+        return None
 
-        db_payload = {k: v for k, v in report_data.items() if k in [
-            'report_id', 'report_size', 'report_type', 'image_url', 'gcs_path',
-            'original_filename', 'status', 'latitude', 'longitude', 'location_accuracy']}
+def _pg_call(pg: tuple, method: str, query: str, *args):
+    """Runs pool.<method>(query, *args) on the pool's loop and waits for the result."""
+    loop, pool = pg
+    return asyncio.run_coroutine_threadsafe(getattr(pool, method)(query, *args), loop).result(timeout=PG_TIMEOUT)
 
-        response = supabase.table(DB_TABLE_REPORTS).insert(db_payload).execute()
-        logger.info(f"Supabase insert response: {response}")
+def _pg_rowcount(status: str) -> int:
+    """Parses the row count from a command status such as 'UPDATE 1'."""
+    try: return int(status.rsplit(" ", 1)[-1])
+    except (AttributeError, ValueError): return 0
 
-        # Handle potential variations in Supabase response structure
-        if hasattr(response, 'data') and response.data:
-            inserted_id = response.data[0].get('report_id')
-            if inserted_id == report_data['report_id']:
-                logger.info(f"Successfully inserted report: {report_data['report_id']}")
-                return report_data['report_id'], None
+def insert_reports(supabase: Client, reports: list[dict]) -> tuple[list[str], list[str]]:
+    """
+    Inserts many reports with one request per batch of INSERT_BATCH_SIZE rows.
+    Returns (IDs now stored, including ones that already existed, error messages).
+    """
+    if not supabase: return [], ["Supabase client not initialized."]
+    inserted_ids, errors = [], []
+    skipped = 0 # Rows that already existed; idempotent retries count them as saved
+
+    payloads = []
+    for report_data in reports:
+        missing = _REQUIRED - report_data.keys()
+        if missing:
+            errors.append(f"Missing required fields for DB insert: {sorted(missing)}")
+            continue
+        payloads.append({k: report_data[k] for k in _ALLOWED & report_data.keys()})
+
+    # Session mode keeps prepared statements, so the constant INSERT_SQL is parsed and planned
+    # once per connection and then served from asyncpg's statement cache
+    pg = _pg_pool("session")
+    rows = iter(payloads)
+    while batch := list(islice(rows, INSERT_BATCH_SIZE)):
+        batch_ids = [row['report_id'] for row in batch]
+        try:
+            if pg:
+                # A single statement is atomic: either the whole batch lands or none of it does
+                written = _pg_call(pg, 'fetch', INSERT_SQL, orjson.dumps(batch).decode())
+                skipped += len(batch_ids) - len(written)
+                inserted_ids.extend(batch_ids)
+                continue
+
+            # ON CONFLICT DO NOTHING: a retried submit is idempotent in one round-trip
+            response = supabase.table(DB_TABLE_REPORTS)\
+                               .upsert(batch, on_conflict="report_id", ignore_duplicates=True)\
+                               .execute()
+            logger.debug("Supabase insert response: %s", response)
+
+            if hasattr(response, 'error') and response.error:
+                error_msg = f"Supabase insert error: {response.error.message}"
+                logger.error(error_msg)
+                errors.append(error_msg)
             else:
-                logger.warning(f"Insert successful but response format unexpected/ID mismatch: {response.data}")
-                return report_data['report_id'], "Insert successful, but validation unclear."
-        elif hasattr(response, 'count') and response.count is not None and response.count > 0:
-            logger.warning(f"Insert count indicates success ({response.count}), but data is empty. Assuming success for ID: {report_data['report_id']}")
-            return report_data['report_id'], None
-        elif hasattr(response, 'error') and response.error:
-            error_msg = f"Supabase insert error: {response.error.message}"
-            logger.error(error_msg)
-            return None, error_msg
-        else:
-            error_msg = f"Insert failed, unknown response structure: {response}"
-            logger.error(error_msg)
-            return None, error_msg
+                # Rows missing from the reply already existed, which counts as success
+                skipped += len(batch_ids) - len(response.data or [])
+                inserted_ids.extend(batch_ids)
 
-    except Exception as e:
-        error_msg = f"Database error inserting report: {e}"
-        logger.error(error_msg, exc_info=True)
-        return None, error_msg
+        except Exception as e:
+            error_msg = f"Database error inserting reports: {e}"
+            logger.error(error_msg, exc_info=True)
+            errors.append(error_msg)
+
+    logger.info("Saved %d of %d reports (%d already existed, insert skipped).", len(inserted_ids), len(reports), skipped)
+    if inserted_ids: _reports_changed()
+    return inserted_ids, errors
+
+def insert_report(supabase: Client, report_data: dict) -> tuple[str | None, str | None]:
+    """Inserts a report into the Supabase database."""
+    inserted_ids, errors = insert_reports(supabase, [report_data])
+    if inserted_ids: return inserted_ids[0], None
+    return None, errors[0] if errors else "Insert failed."
+
+def set_reports_changed_hook(hook) -> None:
+    """Registers a callable run after every successful report write, e.g. to clear a cached report view."""
+    global _reports_changed_hook
+    _reports_changed_hook = hook
 
-def fetch_reports(supabase: Client, limit: int = 100) -> tuple[list[dict] | None, str | None]:
-    """Fetches recent reports from Supabase."""
+def _reports_changed() -> None:
+    """Runs the registered hook (if any); a failing hook never fails the write that triggered it."""
+    if _reports_changed_hook is None: return
+    try: _reports_changed_hook()
+    except Exception as e: logger.warning("Reports-changed hook failed: %s", e)
+
+def fetch_reports(supabase: Client, limit: int = 100, before_cursor: tuple[str, str] | None = None, status: str | None = None, columns: str = REPORT_LIST_COLUMNS) -> tuple[list[dict] | None, str | None]:
+    """
+    Fetches one page of recent reports from Supabase, optionally filtered by status and limited to `columns`.
+    Keyset pagination: pass the last row's `(created_at, report_id)` as `before_cursor` to get the next
+    (older) page. report_id breaks ties, since every row of one batched INSERT shares a created_at.
+    Seeks on the index instead of sorting and skipping; expects
+    `CREATE INDEX ON reports (created_at DESC, report_id DESC);` (or `(status, created_at DESC, report_id DESC)`).
+    Not cached here; callers cache what they build from it and invalidate via set_reports_changed_hook().
+    """
     if not supabase: return None, "Supabase client not initialized."
     try:
-        response = supabase.table(DB_TABLE_REPORTS)\
-                           .select("*")\
-                           .order("created_at", desc=True)\
-                           .limit(limit)\
-                           .execute()
-        logger.info(f"Supabase fetch response: {response}") # Log response
+        query = supabase.table(DB_TABLE_REPORTS).select(columns)
+        if status:
+            query = query.eq("status", status)
+        if before_cursor:
+            created_at, report_id = before_cursor
+            # Row-value comparison (created_at, report_id) < cursor; values quoted for PostgREST's parser
+            query = query.or_(f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",report_id.lt."{report_id}")')
+        response = query.order("created_at", desc=True)\
+                        .order("report_id", desc=True)\
+                        .limit(limit)\
+                        .execute()
+        logger.debug("Supabase fetch response rows=%d", len(getattr(response, 'data', None) or []))
 
         if hasattr(response, 'data'):
-            # Parse timestamp strings
-            for report in response.data:
-                if 'created_at' in report and isinstance(report['created_at'], str):
-                    try: report['created_at_dt'] = datetime.datetime.fromisoformat(report['created_at'].replace('Z', '+00:00'))
-                    except ValueError: report['created_at_dt'] = None
-                else: report['created_at_dt'] = report.get('created_at')
+            # Parse timestamp strings in one vectorized pass; unparseable values become None
+            created = pd.to_datetime(pd.Series([report.get('created_at') for report in response.data], dtype=object),
+                                     format='ISO8601', utc=True, errors='coerce')
+            for report, created_at in zip(response.data, created.astype(object).where(created.notna(), None)):
+                report['created_at_dt'] = created_at
+            if not response.data: logger.info("No reports found matching criteria.")
             return response.data, None # Success, return list (can be empty)
         elif hasattr(response, 'error') and response.error:
             error_msg = f"Fetch failed: {response.error.message}"
@@ -105,19 +259,31 @@ def fetch_reports(supabase: Client, limit: int = 100) -> tuple[list[dict] | None
 def update_report_status(supabase: Client, report_id: str, new_status: str) -> tuple[bool, str | None]:
     """Updates the status of a specific report."""
     if not supabase: return False, "Supabase client not initialized."
+    pg = _pg_pool("transaction")
     try:
+        if pg:
+            if _pg_rowcount(_pg_call(pg, 'execute', UPDATE_STATUS_SQL, new_status, report_id)) > 0:
+                logger.info("Report %s status updated to %s.", report_id, new_status)
+                _reports_changed()
+                return True, None
+            error_msg = f"Update failed for report {report_id} (Report ID might not exist)."
+            logger.warning(error_msg)
+            return False, error_msg
+
         response = supabase.table(DB_TABLE_REPORTS)\
                            .update({"status": new_status})\
                            .eq("report_id", report_id)\
                            .execute()
-        logger.info(f"Supabase update response for {report_id}: {response}")
+        logger.debug("Supabase update response for %s: %s", report_id, response)
 
         # Check different response possibilities for success
         if hasattr(response, 'data') and response.data:
-            logger.info(f"Report {report_id} status updated to {new_status}.")
+            logger.info("Report %s status updated to %s.", report_id, new_status)
+            _reports_changed()
             return True, None
         elif hasattr(response, 'count') and response.count is not None and response.count > 0:
-             logger.info(f"Report {report_id} status updated to {new_status} (based on count).")
+             logger.info("Report %s status updated to %s (based on count).", report_id, new_status)
+             _reports_changed()
              return True, None
         elif hasattr(response, 'error') and response.error:
              error_msg = f"Update failed: {response.error.message}"
@@ -125,7 +291,8 @@ def update_report_status(supabase: Client, report_id: str, new_status: str) -> t
              return False, error_msg
         else: # No data, no count, no error -> likely report_id didn't match
              error_msg = f"Update failed for report {report_id} (Report ID might not exist)."
-             logger.warning(error_msg + f" Response: {response}")
+             logger.warning(error_msg)
+             logger.debug("Response: %s", response)
              return False, error_msg
 
     except Exception as e:
@@ -136,19 +303,31 @@ def update_report_status(supabase: Client, report_id: str, new_status: str) -> t
 def delete_report_metadata(supabase: Client, report_id: str) -> tuple[bool, str | None]:
     """Deletes a report's metadata from Supabase."""
     if not supabase: return False, "Supabase client not initialized."
+    pg = _pg_pool("transaction")
     try:
+        if pg:
+            if _pg_rowcount(_pg_call(pg, 'execute', DELETE_REPORT_SQL, report_id)) > 0:
+                logger.info("Deleted report metadata %s from DB.", report_id)
+                _reports_changed()
+                return True, None
+            error_msg = f"Delete metadata failed for report {report_id} (Report ID might not exist)."
+            logger.warning(error_msg)
+            return False, error_msg
+
         response = supabase.table(DB_TABLE_REPORTS)\
                            .delete()\
                            .eq("report_id", report_id)\
                            .execute()
-        logger.info(f"Supabase delete response for {report_id}: {response}")
+        logger.debug("Supabase delete response for %s: %s", report_id, response)
 
         # Check different response possibilities for success
         if hasattr(response, 'data') and response.data:
-             logger.info(f"Deleted report metadata {report_id} from DB.")
+             logger.info("Deleted report metadata %s from DB.", report_id)
+             _reports_changed()
              return True, None
         elif hasattr(response, 'count') and response.count is not None and response.count > 0:
-             logger.info(f"Deleted report metadata {report_id} from DB (based on count).")
+             logger.info("Deleted report metadata %s from DB (based on count).", report_id)
+             _reports_changed()
              return True, None
         elif hasattr(response, 'error') and response.error:
              error_msg = f"Delete failed: {response.error.message}"
@@ -156,11 +335,48 @@ def delete_report_metadata(supabase: Client, report_id: str) -> tuple[bool, str
              return False, error_msg
         else: # No data, no count, no error -> likely report_id didn't match
              error_msg = f"Delete metadata failed for report {report_id} (Report ID might not exist)."
-             logger.warning(error_msg + f" Response: {response}")
+             logger.warning(error_msg)
+             logger.debug("Response: %s", response)
              # Consider if not found should be success or failure - let's say failure for clarity
              return False, error_msg
 
     except Exception as e:
         error_msg = f"Database error deleting metadata for {report_id}: {e}"
         logger.error(error_msg, exc_info=True)
-        return False, error_msg
\ No newline at end of file
+        return False, error_msg
+
+def delete_reports_metadata(supabase: Client, report_ids: list[str]) -> tuple[list[str], list[str]]:
+    """
+    Deletes many reports' metadata with one request per batch of DELETE_BATCH_SIZE IDs.
+    Returns (IDs actually deleted, error messages).
+    """
+    if not supabase: return [], ["Supabase client not initialized."]
+    deleted_ids, errors = [], []
+    pg = _pg_pool("transaction")
+    ids = iter(report_ids)
+    while batch := list(islice(ids, DELETE_BATCH_SIZE)):
+        try:
+            if pg:
+                rows = _pg_call(pg, 'fetch', DELETE_REPORTS_SQL, batch)
+                deleted_ids.extend(str(row['report_id']) for row in rows)
+                continue
+
+            response = supabase.table(DB_TABLE_REPORTS)\
+                               .delete()\
+                               .in_("report_id", batch)\
+                               .execute()
+            if hasattr(response, 'error') and response.error:
+                error_msg = f"Delete failed: {response.error.message}"
+                logger.error(error_msg)
+                errors.append(error_msg)
+            else:
+                deleted_ids.extend(row.get('report_id') for row in (getattr(response, 'data', None) or []))
+
+        except Exception as e:
+            error_msg = f"Database error deleting reports: {e}"
+            logger.error(error_msg, exc_info=True)
+            errors.append(error_msg)
+
+    logger.info("Deleted %d of %d reports from DB.", len(deleted_ids), len(report_ids))
+    if deleted_ids: _reports_changed()
+    return deleted_ids, errors
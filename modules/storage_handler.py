@@ -1,8 +1,18 @@
 # modules/storage_handler.py
 import streamlit as st
 from google.cloud import storage
+from google.cloud.exceptions import NotFound
 import google.oauth2.service_account
+from google.auth.transport.requests import AuthorizedSession
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
+import io
+import gzip
+import shutil
+import datetime
+from itertools import islice
+from PIL import Image, ImageOps
 from .utils import GCS_REPORT_FOLDER
 import uuid
 from pathlib import Path
@@ -10,24 +20,32 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-# init_gcs function remains the same...
-@st.cache_resource
+PHOTO_MAX_DIMENSION = 1600
+PHOTO_JPEG_QUALITY = 80
+UPLOAD_CHUNK_SIZE = 256 * 1024 # Resumable chunk size; GCS requires a multiple of 256 KiB
+RESUMABLE_UPLOAD_THRESHOLD = 5 * 1024 * 1024 # Larger files are streamed in chunks instead of one request
+UPLOAD_TIMEOUT = (5, 60) # (connect, read) seconds
+SIGNED_URL_EXPIRATION = datetime.timedelta(hours=1)
+GCS_BATCH_SIZE = 100 # Max calls per GCS JSON API batch request
+COMPRESSED_CONTENT_TYPES = frozenset({"image/jpeg", "image/png", "image/webp"}) # Gzip wouldn't shrink these
+
 def init_gcs() -> storage.Bucket | None:
-    """Initializes Google Cloud Storage client and returns the bucket object."""
+    """Initializes Google Cloud Storage client and returns the bucket object. Cached once per process by clients.init_clients()."""
     try:
         gcs_sa_info = json.loads(st.secrets["GCS_SERVICE_ACCOUNT_JSON"])
         credentials = google.oauth2.service_account.Credentials.from_service_account_info(gcs_sa_info)
         logger.info("Initializing GCS client...")
-        storage_client = storage.Client(credentials=credentials)
+        # Reuse one pooled session for every GCS call (cached with the client)
+        session = AuthorizedSession(credentials)
+        session.mount("https://", HTTPAdapter(pool_connections=20, pool_maxsize=50,
+                                              max_retries=Retry(total=3, backoff_factor=0.2)))
+        storage_client = storage.Client(credentials=credentials, _http=session)
         bucket_name = st.secrets["GCS_BUCKET_NAME"]
+        # No bucket.exists() round-trip on cold start; a missing bucket or bad permissions
+        # surface on the first upload, which already reports them
         bucket = storage_client.bucket(bucket_name)
-        if bucket.exists():
-             logger.info(f"GCS client initialized. Connected to bucket: {bucket_name}")
-             return bucket
-        else:
-             st.error(f"GCS Bucket '{bucket_name}' not found or access denied.")
-             logger.error(f"Error: GCS Bucket '{bucket_name}' not found or access denied.")
-             return None
+        logger.info(f"GCS client initialized. Using bucket: {bucket_name}")
+        return bucket
     except KeyError as e:
          st.error(f"🔥 Missing GCS secret: {e}. Check Streamlit secrets.")
          logger.error(f"Missing GCS secret: {e}")
@@ -38,25 +56,62 @@ def init_gcs() -> storage.Bucket | None:
         return None
 
 
-def upload_photo(bucket: storage.Bucket, report_id: str, file_obj, extension: str) -> tuple[str | None, str | None, str | None]:
+def compress_photo(file_obj, max_dimension: int = PHOTO_MAX_DIMENSION, quality: int = PHOTO_JPEG_QUALITY, image_format: str = "JPEG") -> io.BytesIO | None:
+    """Downscales and re-encodes a photo as JPEG (or optimized PNG). Returns None if the image can't be processed."""
+    try:
+        file_obj.seek(0)
+        with Image.open(file_obj) as img:
+            img = ImageOps.exif_transpose(img) # Keep phone photos upright once EXIF is dropped
+            img.thumbnail((max_dimension, max_dimension))
+            buf = io.BytesIO()
+            if image_format == "PNG":
+                img.save(buf, format="PNG", optimize=True)
+            else:
+                img.convert("RGB").save(buf, format="JPEG", quality=quality, optimize=True)
+        buf.seek(0)
+        logger.info(f"Compressed photo to {buf.getbuffer().nbytes} bytes.")
+        return buf
+    except Exception as e:
+        logger.warning(f"Photo compression failed, uploading original: {e}")
+        return None
+
+def photo_location(bucket: storage.Bucket, report_id: str, extension: str) -> tuple[str, str]:
+    """Returns the public URL and GCS path a report's photo is (or will be) stored at."""
+    gcs_path = f"{GCS_REPORT_FOLDER}/{report_id}{extension}"
+    # Format: https://storage.googleapis.com/BUCKET_NAME/OBJECT_NAME (Uniform Bucket Access, no make_public())
+    return f"https://storage.googleapis.com/{bucket.name}/{gcs_path}", gcs_path
+
+def upload_photo(bucket: storage.Bucket, report_id: str, file_obj, extension: str, content_type: str | None = None) -> tuple[str | None, str | None, str | None]:
     """Uploads photo to GCS and returns public URL and GCS path (for Uniform Bucket Access)."""
     if not bucket: return None, None, "GCS bucket not initialized."
     if not file_obj: return None, None, "No file object provided for upload."
 
     try:
-        gcs_path = f"{GCS_REPORT_FOLDER}/{report_id}{extension}"
-        blob = bucket.blob(gcs_path)
+        public_url, gcs_path = photo_location(bucket, report_id, extension)
+        content_type = content_type or file_obj.type
+        content_encoding = None
+        if content_type not in COMPRESSED_CONTENT_TYPES:
+            # Gzip anything not already compressed; GCS decompresses on download for clients that need it
+            gz_buf = io.BytesIO()
+            file_obj.seek(0)
+            with gzip.GzipFile(fileobj=gz_buf, mode="wb", compresslevel=1) as gz:
+                shutil.copyfileobj(file_obj, gz)
+            gz_buf.seek(0)
+            file_obj, content_encoding = gz_buf, "gzip"
 
+        # Stream straight from the file handle. Compressed photos fit in a single multipart
+        # request; anything larger (e.g. an original that couldn't be compressed) is sent as a
+        # resumable upload in fixed-size chunks so only one chunk is held in memory at a time.
+        file_obj.seek(0, io.SEEK_END)
+        size = file_obj.tell()
         file_obj.seek(0)
-        blob.upload_from_file(file_obj, content_type=file_obj.type)
+        chunk_size = UPLOAD_CHUNK_SIZE if size > RESUMABLE_UPLOAD_THRESHOLD else None
+        blob = bucket.blob(gcs_path, chunk_size=chunk_size)
+        blob.content_encoding = content_encoding
+        # if_generation_match=0: report paths are new objects, so never overwrite (and retries stay safe)
+        blob.upload_from_file(file_obj, size=size, content_type=content_type,
+                              checksum="md5", if_generation_match=0, timeout=UPLOAD_TIMEOUT)
         logger.info(f"Image uploaded to GCS path: {gcs_path}")
-
-        # --- CORRECTION: Do NOT call make_public() for Uniform Buckets ---
-        # blob.make_public() # REMOVE OR COMMENT OUT THIS LINE
-
-        # --- Construct the public URL manually for uniform access ---
-        # Format: https://storage.googleapis.com/BUCKET_NAME/OBJECT_NAME
-        public_url = f"https://storage.googleapis.com/{bucket.name}/{gcs_path}"
         logger.info(f"Constructed Public URL (Uniform Access): {public_url}")
 
         return public_url, gcs_path, None # Success
@@ -69,24 +124,74 @@ def upload_photo(bucket: storage.Bucket, report_id: str, file_obj, extension: st
              error_msg += " (Check Service Account permissions - needs Storage Object Creator/Admin)"
         return None, None, error_msg
 
-# delete_photo function remains the same...
+# Signed URLs embed their signing time, so re-signing on every rerun would change the URL and make
+# the browser re-download the image. Cache for half the expiry so a served URL is always still valid.
+@st.cache_data(ttl=SIGNED_URL_EXPIRATION / 2, show_spinner=False)
+def sign_urls(_bucket: storage.Bucket, paths: tuple[str, ...]) -> list[str | None]:
+    """
+    Returns V4 signed GET URLs for objects in a private bucket, in the same order as `paths`.
+    The client's service-account key signs locally, so no request is made per URL.
+    """
+    urls = []
+    for gcs_path in paths:
+        try:
+            urls.append(_bucket.blob(gcs_path).generate_signed_url(version="v4", expiration=SIGNED_URL_EXPIRATION, method="GET"))
+        except Exception as e:
+            logger.warning(f"Could not sign URL for {gcs_path}: {e}")
+            urls.append(None)
+    return urls
+
 def delete_photo(bucket: storage.Bucket, gcs_path: str) -> tuple[bool, str | None]:
     """Deletes a photo from GCS given its path."""
     if not bucket: return False, "GCS bucket not initialized."
     if not gcs_path: return False, "No GCS path provided for deletion."
     try:
-        blob = bucket.blob(gcs_path)
-        if blob.exists():
-             blob.delete()
-             logger.info(f"Deleted image {gcs_path} from GCS.")
-             return True, None
-        else:
-             logger.warning(f"Image {gcs_path} not found in GCS for deletion.")
-             return True, "Image already deleted or path incorrect."
+        # Delete directly and treat 404 as already gone: one round-trip instead of exists() + delete()
+        bucket.blob(gcs_path).delete()
+        logger.info(f"Deleted image {gcs_path} from GCS.")
+        return True, None
+    except NotFound:
+        logger.warning(f"Image {gcs_path} not found in GCS for deletion.")
+        return True, "Image already deleted or path incorrect."
     except Exception as e:
         error_msg = f"GCS deletion failed for {gcs_path}: {e}"
         # Check for permission error during delete
         if "403" in str(e) or "permission" in str(e).lower():
              error_msg += " (Check Service Account permissions - needs Storage Object Admin)"
         logger.error(error_msg, exc_info=True)
-        return False, error_msg
\ No newline at end of file
+        return False, error_msg
+
+def delete_photos(bucket: storage.Bucket, gcs_paths: list[str]) -> tuple[list[str], list[str]]:
+    """
+    Deletes many photos from GCS, sending up to GCS_BATCH_SIZE deletes per batch HTTP request.
+    Returns (paths deleted or already gone, error messages).
+    """
+    if not bucket: return [], ["GCS bucket not initialized."]
+    targets = [p for p in gcs_paths if p]
+    deleted, errors = [], []
+    paths = iter(targets)
+    while batch := list(islice(paths, GCS_BATCH_SIZE)):
+        try:
+            with bucket.client.batch(): # Raises if any delete in the batch failed
+                bucket.delete_blobs(batch)
+            deleted.extend(batch)
+            continue
+        except Exception as e:
+            logger.warning(f"GCS batch delete had failures, retrying {len(batch)} deletes individually: {e}")
+        # The batch doesn't say which delete failed; redo them one by one. Deletes that already
+        # succeeded (or photos that were never there) now return 404, which counts as gone.
+        for gcs_path in batch:
+            try:
+                bucket.delete_blob(gcs_path)
+                deleted.append(gcs_path)
+            except NotFound:
+                deleted.append(gcs_path)
+            except Exception as e:
+                error_msg = f"GCS deletion failed for {gcs_path}: {e}"
+                if "403" in str(e) or "permission" in str(e).lower():
+                     error_msg += " (Check Service Account permissions - needs Storage Object Admin)"
+                logger.error(error_msg)
+                errors.append(error_msg)
+
+    logger.info(f"Deleted {len(deleted)} of {len(targets)} images from GCS.")
+    return deleted, errors